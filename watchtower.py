@@ -4,7 +4,8 @@ Supplychain Watchtower
 
 Reads:
   - all YAML files from the watch/ directory  (list of repo URLs to watch)
-  - state.yaml  (mapping of repo URL -> last seen version tag)
+  - state.json  (mapping of repo URL -> last seen version tag; a legacy
+    state.yaml is read as a fallback when upgrading)
 
 Does:
   - For each repo, fetch the latest version (release tag preferred; else latest tag)
@@ -12,38 +13,97 @@ Does:
 
 Writes:
   - process.yaml (only repos that changed this run)
-  - state.yaml   (updated "last seen" versions)
+  - state.json   (updated "last seen" versions)
+  - etags.json   (per-repo ETags for conditional requests on the next run)
 
 Env:
   - GITHUB_TOKEN (required) – token with read access for public repos
-  - WATCH_FILE / STATE_FILE / PROCESS_FILE (optional) – override default filenames
+  - WATCH_FILE / STATE_FILE / PROCESS_FILE / ETAGS_FILE (optional) – override default filenames
   - INCLUDE_PRERELEASE (optional, default "false") – set to "true" to consider pre-releases as latest
+  - WATCHTOWER_CONCURRENCY (optional, default 16) – number of repos checked in parallel
+  - WATCHTOWER_LOG_LEVEL (optional, default "INFO") – e.g. WARNING for quiet scheduled runs
 
 Key Functions:
 parse_repo_url() - extracts owner and repo name from various GitHub URL formats (HTTPS, SSH)
-latest_version_for_repo() - determines the latest version by:
+latest_versions_for_batch() - resolves up to 50 repos with a single GraphQL POST (primary path)
+latest_version_for_repo() - per-repo REST fallback; determines the latest version by:
   - First checking for the latest non-draft release
   - Falling back to the most recent tag if no releases exist
   - Can optionally include pre-releases if INCLUDE_PRERELEASE=true
 """
 
+# Heavy third-party modules (yaml, github, requests, aiohttp, orjson) are
+# imported lazily inside the functions that need them: cron-driven runs pay
+# module-import cost on every invocation, and e.g. PyGithub alone drags in
+# requests/urllib3/crypto before a single API call is made. Annotations stay
+# lazy via __future__ so the type names below never trigger an import.
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
 import os
+import queue
+import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 
-import yaml
-from github import Github
-from github.GithubException import GithubException
+if TYPE_CHECKING:  # imports for annotations only – never executed at runtime
+    import requests
+    from github import Github
 
 
 # ---------- Config ----------
 # Load configuration from environment variables with sensible defaults
 
 WATCH_FILE = Path(os.environ.get("WATCH_FILE", "watch"))  # Default to directory
-STATE_FILE = Path(os.environ.get("STATE_FILE", "state.yaml"))
+STATE_FILE = Path(os.environ.get("STATE_FILE", "state.json"))
 PROCESS_FILE = Path(os.environ.get("PROCESS_FILE", "process.yaml"))
+ETAGS_FILE = Path(os.environ.get("ETAGS_FILE", "etags.json"))
 INCLUDE_PRERELEASE = os.environ.get("INCLUDE_PRERELEASE", "false").lower() == "true"
+CONCURRENCY = max(1, int(os.environ.get("WATCHTOWER_CONCURRENCY", "16")))
+
+LOG = logging.getLogger("watchtower")
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+# GitHub rejects GraphQL queries with too many aliased sub-queries; 50 repos
+# per POST stays well under the node limit while still collapsing the
+# 2-3 REST calls per repo into a handful of requests per run.
+GRAPHQL_BATCH_SIZE = 50
+
+# In the default configuration latestRelease is all we need: GitHub's own
+# "newest non-draft, non-prerelease release" – one tiny node, no pagination,
+# no client-side filtering (the GraphQL twin of REST's /releases/latest).
+# Only when INCLUDE_PRERELEASE=true must the full release list be fetched
+# and filtered here.
+RELEASE_SELECTION = (
+    """releases(first: 10, orderBy: {field: CREATED_AT, direction: DESC}) {
+    nodes { tagName name isDraft isPrerelease }
+  }"""
+    if INCLUDE_PRERELEASE
+    else "latestRelease { tagName name }"
+)
+
+# Shared selection set for each aliased repository() sub-query: the latest
+# release (or first pages of releases, newest first), the most recent tag
+# as a fallback, and the last-push timestamp used to skip idle repos on the
+# next run.
+GRAPHQL_REPO_FRAGMENT = f"""\
+fragment watchFields on Repository {{
+  pushedAt
+  {RELEASE_SELECTION}
+  refs(refPrefix: "refs/tags/", first: 1,
+       orderBy: {{field: TAG_COMMIT_DATE, direction: DESC}}) {{
+    nodes {{ name }}
+  }}
+}}"""
 
 
 # ---------- Helpers ----------
@@ -69,6 +129,50 @@ def die(msg: str, code: int = 1) -> None:
     sys.exit(code)  # Exit immediately with the specified code
 
 
+def setup_logging() -> QueueListener:
+    """
+    Route all log records through a queue to a single stdout handler.
+
+    Worker threads and coroutines only enqueue records (cheap, no stream
+    I/O in the hot path); the listener's own thread performs the actual
+    writes, so stdout syscalls are batched in one place and records never
+    interleave. The level comes from WATCHTOWER_LOG_LEVEL (default INFO;
+    set WARNING for quiet scheduled runs).
+
+    Returns:
+        The started QueueListener; the caller stops it before exiting so
+        queued records are flushed
+    """
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(log_queue, handler)
+    LOG.addHandler(QueueHandler(log_queue))
+    LOG.setLevel(os.environ.get("WATCHTOWER_LOG_LEVEL", "INFO").upper())
+    listener.start()
+    return listener
+
+
+def ensure_token() -> str:
+    """
+    Read the GitHub API token from the environment.
+
+    Checks these environment variables in order:
+        1. GITHUB_TOKEN (preferred)
+        2. GH_TOKEN (alternative, used by GitHub CLI)
+
+    Returns:
+        str: The token, used both for GraphQL POSTs and the PyGithub client
+
+    Raises:
+        SystemExit: If neither GITHUB_TOKEN nor GH_TOKEN is set (via die())
+    """
+    token = os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN")
+    if not token:
+        die("GITHUB_TOKEN (or GH_TOKEN) env var not set")
+    return token
+
+
 def ensure_github() -> Github:
     """
     Create and return an authenticated GitHub API client.
@@ -91,54 +195,111 @@ def ensure_github() -> Github:
         gh = ensure_github()
         repo = gh.get_repo("owner/repo")
     """
-    token = os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN")
-    if not token:
-        die("GITHUB_TOKEN (or GH_TOKEN) env var not set")
-    return Github(token)
+    from github import Github  # deferred: PyGithub is a heavyweight import
+
+    # Same pool width and retry budget as the shared session, so PyGithub's
+    # connections are reused across workers too
+    return Github(ensure_token(), pool_size=CONCURRENCY, retry=3)
+
+
+def yaml_codec() -> Tuple[Any, Any, Any]:
+    """
+    Import PyYAML on first use and pick the libyaml classes when available.
+
+    The libyaml-backed CSafeLoader/CSafeDumper parse and emit in C, roughly
+    10x faster than the pure-Python classes – noticeable with a directory
+    full of watch files. Deferred so runs that die before touching any YAML
+    never pay the import. Repeat calls are cheap sys.modules lookups.
+
+    Returns:
+        (yaml module, loader class, dumper class)
+    """
+    import yaml
+
+    try:
+        from yaml import CSafeDumper as YamlDumper, CSafeLoader as YamlLoader
+    except ImportError:
+        # PyYAML built without libyaml – same behavior, just slower
+        from yaml import SafeDumper as YamlDumper, SafeLoader as YamlLoader
+    return yaml, YamlLoader, YamlDumper
+
+
+def json_codec() -> Optional[Any]:
+    """
+    Import orjson on first use; returns None when it isn't installed.
+
+    orjson decodes/encodes the machine-only state/etag files in C; callers
+    fall back to the stdlib json module when it is absent.
+    """
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
 
 
 def load_yaml(path: Path, default: Any) -> Any:
     """
-    Load and parse a YAML file, returning a default value if file doesn't exist.
+    Load and parse a YAML or JSON file, returning a default if it doesn't exist.
 
-    This function safely handles missing files and empty YAML files by returning
-    a default value instead of crashing. This is useful for optional config files
-    or when initializing state on first run.
+    The format is picked from the file suffix: ".json" files are parsed with
+    orjson (C-accelerated, ~10x faster than YAML parsing) or the stdlib json
+    module; everything else is parsed as YAML. JSON is used for the
+    machine-only state/etag files, which nobody reads by hand; the
+    human-authored watch/*.yaml files stay YAML.
+
+    This function safely handles missing files and empty files by returning
+    a default value instead of crashing. This is useful for optional config
+    files or when initializing state on first run.
 
     Args:
-        path: Path object pointing to the YAML file to load
+        path: Path object pointing to the YAML/JSON file to load
         default: Value to return if file doesn't exist or is empty/null
 
     Returns:
-        The parsed YAML data (typically a dict or list), or the default value
+        The parsed data (typically a dict or list), or the default value
 
     Example:
         config = load_yaml(Path("config.yaml"), default={})
         # Returns {} if config.yaml doesn't exist or is empty
 
-        repos = load_yaml(Path("repos.yaml"), default=[])
-        # Returns [] if repos.yaml doesn't exist
+        state = load_yaml(Path("state.json"), default={})
+        # Returns {} if state.json doesn't exist
     """
     if not path.exists():
         return default
+    if path.suffix == ".json":
+        raw = path.read_bytes()
+        if not raw.strip():
+            return default
+        orjson = json_codec()
+        return (orjson.loads(raw) if orjson else json.loads(raw)) or default
+    yaml, YamlLoader, _dumper = yaml_codec()
     with path.open("r", encoding="utf-8") as f:
-        data = yaml.safe_load(f) or default
+        data = yaml.load(f, Loader=YamlLoader) or default
     return data
 
 
-def dump_yaml(path: Path, obj: Any) -> None:
+def dump_yaml(path: Path, obj: Any, sort_keys: bool = True) -> None:
     """
-    Write a Python object to a YAML file with consistent formatting.
+    Write a Python object to a YAML or JSON file with consistent formatting.
 
-    This function serializes Python data structures (dicts, lists, etc.) to YAML
-    format with settings optimized for version control and human readability:
+    The format is picked from the file suffix, mirroring load_yaml():
+    ".json" files are written with orjson (or the stdlib json module),
+    everything else as YAML. Both formats share the same conventions,
+    optimized for version control and human readability:
     - Sorts keys alphabetically for consistent diffs
     - Preserves Unicode characters
     - Uses safe serialization (no Python-specific types)
 
     Args:
-        path: Path object where the YAML file should be written
+        path: Path object where the file should be written
         obj: Python object to serialize (dict, list, str, int, etc.)
+        sort_keys: Sort mapping keys while emitting. Pass False for objects
+            that were already built in sorted order – the serializers' own
+            sorting walks every key through per-item comparisons, which is
+            measurably slower than one dict(sorted(...)) up front on large
+            maps
 
     Returns:
         None
@@ -148,83 +309,451 @@ def dump_yaml(path: Path, obj: Any) -> None:
         dump_yaml(Path("output.yaml"), data)
         # Creates output.yaml with sorted keys
     """
+    # Write to a temp file in the same directory and rename it over the
+    # target: os.replace is a single atomic syscall, so a crash mid-write
+    # can no longer leave a truncated state file behind (which would force
+    # a full rescan on the next run).
+    tmp = path.with_suffix(path.suffix + ".tmp")
     # pretty, stable ordering for diffs
-    with path.open("w", encoding="utf-8") as f:
-        yaml.safe_dump(obj, f, sort_keys=True, allow_unicode=True)
+    if path.suffix == ".json":
+        orjson = json_codec()
+        if orjson:
+            option = orjson.OPT_INDENT_2
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            payload = orjson.dumps(obj, option=option)
+        else:
+            payload = json.dumps(
+                obj, indent=2, sort_keys=sort_keys, ensure_ascii=False
+            ).encode("utf-8")
+        with tmp.open("wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        yaml, _loader, YamlDumper = yaml_codec()
+        with tmp.open("w", encoding="utf-8") as f:
+            yaml.dump(obj, f, Dumper=YamlDumper, sort_keys=sort_keys, allow_unicode=True)
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def prefer_existing(path: Path) -> Path:
+    """
+    Return path, or its legacy .yaml sibling if path is missing.
+
+    Used when loading the state/etag files so that checkouts upgraded from
+    the YAML-era filenames (state.yaml, etags.yaml) keep their history; new
+    runs then write the JSON filename and the sibling is left behind.
+    """
+    if not path.exists():
+        legacy = path.with_suffix(".yaml")
+        if legacy.exists():
+            return legacy
+    return path
+
+
+# Compiled once at import: a single match replaces the old chain of
+# split/startswith/endswith calls and their intermediate string allocations.
+# The prefix is optional so a bare "owner/repo" still parses; ".git",
+# extra path segments (e.g. /tree/main, /releases), and query/fragment
+# suffixes after the repo name are stripped by the pattern.
+REPO_URL_RE = re.compile(
+    r"^(?:git@github\.com:|(?:https?://)?(?:www\.)?github\.com/)?"
+    r"(?P<owner>[^/\s:]+)/(?P<repo>[^/\s#?]+?)"
+    r"(?:\.git)?(?:[/#?][^\s]*)?$"
+)
 
 
+@lru_cache(maxsize=None)
 def parse_repo_url(url: str) -> Tuple[str, str]:
     """
+    Pure string parsing, so results are memoized: the same URL may be parsed
+    again on fallback/retry paths and repeat lookups are then free.
+
     Accepts formats like:
       https://github.com/owner/repo
       https://github.com/owner/repo.git
       git@github.com:owner/repo.git
     Returns: (owner, repo)
     """
-    u = url.strip()
+    m = REPO_URL_RE.match(url.strip())
+    if not m:
+        raise ValueError(f"Could not parse GitHub repo from URL: {url}")
+    return m.group("owner"), m.group("repo")
+
 
-    # SSH format
-    if u.startswith("git@github.com:"):
-        u = u.split("git@github.com:", 1)[1]
+class RateLimitGuard:
+    """
+    Track GitHub's X-RateLimit headers and pause before the quota runs dry.
 
-    # HTTPS format
-    if "github.com/" in u:
-        u = u.split("github.com/", 1)[1]
+    Naive polling that blows through the primary quota trips GitHub's
+    secondary rate limits, turning slow responses into hour-long blocks.
+    Every worker reports the rate-limit headers it sees; once the remaining
+    quota drops below the threshold, the next worker sleeps until the
+    advertised reset time instead of burning the last units into a 403.
 
-    # Remove query/fragments and trailing .git or slashes
-    u = u.split("#")[0].split("?")[0].strip("/")
-    if u.endswith(".git"):
-        u = u[:-4]
+    Thread-safe: the counters sit behind a lock and are shared by all
+    workers on the pool.
+    """
 
-    parts = u.split("/")
-    if len(parts) < 2:
-        raise ValueError(f"Could not parse GitHub repo from URL: {url}")
-    owner, repo = parts[0], parts[1]
-    return owner, repo
+    def __init__(self, threshold: int):
+        self._lock = threading.Lock()
+        self._threshold = threshold
+        self._remaining: Optional[int] = None
+        self._reset: float = 0.0
+
+    def update(self, headers: Any) -> None:
+        """Record the remaining quota/reset time from a response's headers."""
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, TypeError, ValueError):
+            return  # header missing (e.g. some 304s) – keep the last reading
+        self.update_values(remaining, reset)
+
+    def update_values(self, remaining: int, reset: float) -> None:
+        """Record the remaining quota/reset time directly (PyGithub path)."""
+        with self._lock:
+            self._remaining = remaining
+            self._reset = reset
+
+    def pause_needed(self) -> float:
+        """Seconds to pause before the next request (0.0 when quota is fine)."""
+        with self._lock:
+            if self._remaining is None or self._remaining >= self._threshold:
+                return 0.0
+            delay = self._reset - time.time()
+            # Forget the stale reading so only one worker sleeps per reset
+            self._remaining = None
+        if delay <= 0:
+            return 0.0
+        LOG.warning("rate limit nearly exhausted; sleeping %.0fs until reset", delay)
+        return delay + 1
+
+    def wait_if_low(self) -> None:
+        """Sleep until the quota resets if the remaining budget is too thin.
+
+        Blocking flavor for the threaded path; the async path awaits
+        asyncio.sleep(pause_needed()) instead so the event loop stays free.
+        """
+        delay = self.pause_needed()
+        if delay:
+            time.sleep(delay)
+
+
+# Shared by all workers; keep enough headroom that a full wave of in-flight
+# requests can still land without tripping the secondary limits.
+RATE_LIMIT = RateLimitGuard(threshold=min(CONCURRENCY, 100))
+
+
+def make_session(token: str) -> requests.Session:
+    """
+    Build the shared requests Session for GraphQL batches and prechecks.
+
+    One Session means one connection pool: the TLS handshake to
+    api.github.com is paid once per pooled connection and the connections
+    are then reused across all worker threads, instead of being re-opened
+    per request. The pool is sized to the thread count so workers never
+    queue on a free connection, and transient gateway errors are retried
+    with backoff at the transport level.
+
+    Args:
+        token: GitHub API token, set as the session-wide Authorization header
+
+    Returns:
+        requests.Session ready for api.github.com traffic
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    session.headers["Authorization"] = f"bearer {token}"
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        # The GraphQL POSTs are read-only queries, so retrying them is safe
+        allowed_methods=frozenset({"GET", "POST"}),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=CONCURRENCY, pool_maxsize=CONCURRENCY, max_retries=retry
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+def release_feed_unchanged(
+    session: requests.Session,
+    owner: str,
+    name: str,
+    etag: str,
+) -> Tuple[bool, Optional[str]]:
+    """
+    Probe a repo's releases feed with a conditional request.
+
+    Sends If-None-Match with the ETag captured on a previous run. A 304
+    answer is essentially zero bytes and does not count against GitHub's
+    primary rate limit, so unchanged repos (the dominant case) cost almost
+    nothing to re-check.
+
+    Args:
+        session: requests Session with the Authorization header already set
+        owner: Repo owner, as parsed by parse_repo_url
+        name: Repo name, as parsed by parse_repo_url
+        etag: ETag from the previous run, or "" on the first check
+
+    Returns:
+        (unchanged, new_etag) – unchanged is True iff the server answered
+        304; new_etag is the ETag to persist for the next run (None if the
+        response carried none, e.g. on errors)
+    """
+    # Probe conditionally only when a previous run captured an ETag. With
+    # no stored ETag the probe is deliberately unconditional: a 304 never
+    # carries an ETag, so only the full 200 response can seed etags[url],
+    # and a validator here could otherwise keep a repo off the ETag path
+    # forever.
+    headers = {"If-None-Match": etag} if etag else {}
+    RATE_LIMIT.wait_if_low()
+    resp = session.get(
+        f"https://api.github.com/repos/{owner}/{name}/releases",
+        params={"per_page": 1},
+        headers=headers,
+        timeout=30,
+    )
+    RATE_LIMIT.update(resp.headers)
+    if resp.status_code == 304:
+        return True, etag
+    if resp.ok:
+        return False, resp.headers.get("ETag")
+    return False, None
+
+
+def version_from_graphql_node(node: Dict[str, Any]) -> Optional[str]:
+    """
+    Pick the latest version out of one repository() node from a GraphQL batch.
 
+    Applies the same priority as latest_version_for_repo():
+      1. Newest non-draft release (exclude prerelease unless INCLUDE_PRERELEASE=true)
+      2. Fallback to the most recent tag
 
-def latest_version_for_repo(gh: Github, repo_url: str) -> Optional[str]:
+    Depending on RELEASE_SELECTION the node carries either a single
+    latestRelease (already filtered by GitHub) or a releases list that is
+    filtered here.
+    """
+    latest_release = node.get("latestRelease")
+    if latest_release:
+        if latest_release.get("tagName"):
+            return latest_release["tagName"]
+        # Fallback: sometimes releases may lack tag_name – try name
+        if latest_release.get("name"):
+            return latest_release["name"]
+
+    for rel in (node.get("releases") or {}).get("nodes") or []:
+        if rel.get("isDraft"):
+            continue
+        if not INCLUDE_PRERELEASE and rel.get("isPrerelease"):
+            continue
+        if rel.get("tagName"):
+            return rel["tagName"]
+        if rel.get("name"):
+            return rel["name"]
+
+    refs = (node.get("refs") or {}).get("nodes") or []
+    if refs:
+        return refs[0]["name"]  # GitHub returns most recent first
+    return None
+
+
+def build_batch_query(batch: List[Tuple[str, str, str]]) -> str:
+    """
+    Build the GraphQL query for one batch of (url, owner, name) tuples.
+
+    Each repo becomes an aliased repository() sub-query sharing
+    GRAPHQL_REPO_FRAGMENT; aliases are positional (r0, r1, ...) so
+    versions_from_batch_payload can match responses back to URLs.
+    """
+    parts = [
+        # json.dumps quotes/escapes the owner and name for the query string
+        f"r{i}: repository(owner: {json.dumps(owner)}, "
+        f"name: {json.dumps(name)}) {{ ...watchFields }}"
+        for i, (_url, owner, name) in enumerate(batch)
+    ]
+    return "query {\n" + "\n".join(parts) + "\n}\n" + GRAPHQL_REPO_FRAGMENT
+
+
+def versions_from_batch_payload(
+    batch: List[Tuple[str, str, str]], payload: Dict[str, Any]
+) -> Tuple[Dict[str, Tuple[Optional[str], List[str]]], Dict[str, str]]:
+    """
+    Map one GraphQL response payload back to per-repo (version, log) results.
+
+    Repos GitHub could not resolve (missing/renamed/private) come back as a
+    null alias plus an entry in the top-level errors list; those yield a
+    None version with the reported reason in the log lines.
+
+    Returns:
+        (results, pushed) – results maps repo URL -> (version, log_lines);
+        pushed maps repo URL -> pushedAt timestamp, persisted so the next
+        run can skip version derivation for repos that haven't been pushed
+    """
+    data = payload.get("data") or {}
+    results: Dict[str, Tuple[Optional[str], List[str]]] = {}
+    pushed: Dict[str, str] = {}
+    for i, (url, _owner, _name) in enumerate(batch):
+        node = data.get(f"r{i}")
+        if node is None:
+            reason = next(
+                (
+                    e.get("message", "unknown error")
+                    for e in payload.get("errors") or []
+                    if e.get("path") == [f"r{i}"]
+                ),
+                "unknown error",
+            )
+            results[url] = (None, [f"  - {url}: cannot access repo ({reason})"])
+            continue
+        results[url] = (version_from_graphql_node(node), [])
+        if node.get("pushedAt"):
+            pushed[url] = node["pushedAt"]
+    return results, pushed
+
+
+def latest_versions_for_batch(
+    session: requests.Session, batch: List[Tuple[str, str, str]]
+) -> Tuple[Dict[str, Tuple[Optional[str], List[str]]], Dict[str, str]]:
+    """
+    Resolve the latest version for a batch of repos with one GraphQL POST.
+
+    Each repo becomes an aliased repository() sub-query sharing
+    GRAPHQL_REPO_FRAGMENT, so a batch of up to GRAPHQL_BATCH_SIZE repos costs
+    a single HTTPS round-trip instead of 2-3 REST calls per repo.
+
+    Args:
+        session: requests Session with the Authorization header already set
+        batch: list of (url, owner, name) tuples, as parsed by parse_repo_url
+
+    Returns:
+        The (results, pushed) pair from versions_from_batch_payload()
+
+    Raises:
+        requests.RequestException: If the POST itself fails; the caller falls
+        back to per-repo REST checks for the whole batch
+    """
+    RATE_LIMIT.wait_if_low()
+    resp = session.post(
+        GRAPHQL_URL, json={"query": build_batch_query(batch)}, timeout=30
+    )
+    RATE_LIMIT.update(resp.headers)
+    resp.raise_for_status()
+    return versions_from_batch_payload(batch, resp.json())
+
+
+def canonical_timestamp(dt: datetime) -> str:
+    """
+    Render a datetime in GitHub's ISO-8601 UTC form ("...Z").
+
+    GraphQL's pushedAt arrives as e.g. "2026-01-01T12:00:00Z" while
+    PyGithub hands back datetime objects whose isoformat() ends in
+    "+00:00"; the pushed_map skip compares the stored string against the
+    fresh one, so both write paths must agree on a single format.
+    """
+    if dt.tzinfo is None:
+        # Older PyGithub returns naive datetimes that are already UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def latest_version_for_repo(
+    gh: Github,
+    repo_url: str,
+    cached_version: Optional[str] = None,
+    pushed_map: Optional[Dict[str, str]] = None,
+) -> Tuple[Optional[str], List[str]]:
     """
     Determine the latest version string for a repo.
 
     Priority:
       1. Latest non-draft release (exclude prerelease unless INCLUDE_PRERELEASE=true)
       2. Fallback to the most recent tag (by list order from API)
+
+    The get_repo response already carries the repo's pushed_at timestamp, so
+    when it matches the one stored on the previous run (pushed_map) and a
+    cached_version exists, the release/tag traversal is skipped entirely –
+    nothing can have changed without a push.
+
+    Returns a (version, log_lines) tuple. Log lines are buffered instead of
+    printed so that concurrent checks don't interleave their output; the
+    caller prints them once the check completes.
     """
+    from github.GithubException import GithubException
+
+    log: List[str] = []
     owner, name = parse_repo_url(repo_url)
+    RATE_LIMIT.wait_if_low()
     try:
         repo = gh.get_repo(f"{owner}/{name}")
+        # PyGithub caches the rate-limit headers of the last response
+        remaining, _limit = gh.rate_limiting
+        RATE_LIMIT.update_values(remaining, gh.rate_limiting_resettime)
     except GithubException as e:
-        print(
+        log.append(
             f"  - {repo_url}: cannot access repo ({e.data if hasattr(e, 'data') else e})"
         )
-        return None
+        return None, log
+
+    # Skip the release/tag calls when the repo hasn't been pushed since the
+    # last run – pushed_at comes free with the get_repo response. Normalized
+    # so it compares equal to the pushedAt strings the GraphQL path stores.
+    pushed_at = canonical_timestamp(repo.pushed_at) if repo.pushed_at else None
+    if pushed_map is not None and pushed_at:
+        if cached_version and pushed_map.get(repo_url) == pushed_at:
+            log.append("  - no push since last check; using cached version")
+            return cached_version, log
+        pushed_map[repo_url] = pushed_at
 
     # Try releases first
-    try:
-        releases = list(repo.get_releases())
-        for rel in releases:
-            if rel.draft:
-                continue
-            if not INCLUDE_PRERELEASE and rel.prerelease:
-                continue
+    if not INCLUDE_PRERELEASE:
+        # /releases/latest returns exactly the newest non-draft,
+        # non-prerelease release in one small response – no pagination and
+        # no client-side filtering needed. 404 just means no releases.
+        try:
+            rel = repo.get_latest_release()
             if rel.tag_name:
-                return rel.tag_name
+                return rel.tag_name, log
             # Fallback: sometimes releases may lack tag_name – try name
             if rel.title:
-                return rel.title
-    except GithubException as e:
-        print(f"  - {repo_url}: failed to list releases ({e})")
-
-    # Fallback to tags
+                return rel.title, log
+        except GithubException as e:
+            if getattr(e, "status", None) != 404:
+                log.append(f"  - {repo_url}: failed to fetch latest release ({e})")
+    else:
+        # Pre-releases count, so page through the full list. Iterate the
+        # PaginatedList lazily (no list(...)): PyGithub fetches a page at a
+        # time, so returning on the first acceptable release avoids
+        # downloading every subsequent page.
+        try:
+            for rel in repo.get_releases():
+                if rel.draft:
+                    continue
+                if rel.tag_name:
+                    return rel.tag_name, log
+                if rel.title:
+                    return rel.title, log
+        except GithubException as e:
+            log.append(f"  - {repo_url}: failed to list releases ({e})")
+
+    # Fallback to tags – only the first one is needed, so fetch lazily too
     try:
-        tags = list(repo.get_tags())
-        if tags:
-            return tags[0].name  # GitHub returns most recent first
+        first_tag = next(iter(repo.get_tags()), None)
+        if first_tag is not None:
+            return first_tag.name, log  # GitHub returns most recent first
     except GithubException as e:
-        print(f"  - {repo_url}: failed to list tags ({e})")
+        log.append(f"  - {repo_url}: failed to list tags ({e})")
 
-    return None
+    return None, log
 
 
 def load_watch_repositories(watch_path: Path) -> list:
@@ -250,28 +779,38 @@ def load_watch_repositories(watch_path: Path) -> list:
     """
     repositories = []
 
-    # If it's a directory, load all .yaml files
+    # If it's a directory, load all .yaml files. os.scandir batches the
+    # directory reads and its DirEntry objects cache stat results, so this
+    # is cheaper than Path.glob for directories with many entries.
     if watch_path.is_dir():
-        yaml_files = sorted(watch_path.glob("*.yaml"))
+        yaml_files = sorted(
+            Path(entry.path)
+            for entry in os.scandir(watch_path)
+            if entry.name.endswith(".yaml") and entry.is_file()
+        )
         if not yaml_files:
-            print(f"WARNING: No .yaml files found in {watch_path}")
+            LOG.warning("No .yaml files found in %s", watch_path)
             return repositories
 
-        print(f"Loading from directory: {watch_path}")
-        for yaml_file in yaml_files:
-            print(f"  - Reading {yaml_file.name}")
-            data = load_yaml(yaml_file, default={})
+        LOG.info("Loading from directory: %s", watch_path)
+        # Read + parse the shards concurrently: disk reads overlap with YAML
+        # parsing. executor.map preserves input order, so the combined list
+        # is identical to the old sequential loop over the sorted files.
+        with ThreadPoolExecutor(max_workers=min(32, len(yaml_files))) as executor:
+            loaded = list(executor.map(lambda p: load_yaml(p, default={}), yaml_files))
+        for yaml_file, data in zip(yaml_files, loaded):
+            LOG.info("  - Reading %s", yaml_file.name)
             repos = data.get("repositories") or []
             if isinstance(repos, list):
                 repositories.extend(repos)
             else:
-                print(
-                    f"    WARNING: {yaml_file.name} does not contain a 'repositories' list"
+                LOG.warning(
+                    "%s does not contain a 'repositories' list", yaml_file.name
                 )
 
     # If it's a file, load it directly (backward compatibility)
     elif watch_path.is_file():
-        print(f"Loading from file: {watch_path}")
+        LOG.info("Loading from file: %s", watch_path)
         data = load_yaml(watch_path, default={})
         repos = data.get("repositories") or []
         if isinstance(repos, list):
@@ -286,12 +825,285 @@ def load_watch_repositories(watch_path: Path) -> list:
     return repositories
 
 
+def parse_watch_urls(
+    repo_urls: List[str],
+) -> Tuple[
+    List[Tuple[str, str, str]], Dict[str, Tuple[Optional[str], List[str]]]
+]:
+    """
+    Split the watch list into parseable (url, owner, name) tuples and
+    ready-made error results for malformed URLs (no API call needed).
+    """
+    parsed: List[Tuple[str, str, str]] = []
+    results: Dict[str, Tuple[Optional[str], List[str]]] = {}
+    for url in repo_urls:
+        try:
+            owner, name = parse_repo_url(url)
+        except ValueError as e:
+            results[url] = (None, [f"  - {url}: {e}"])
+            continue
+        parsed.append((url, owner, name))
+    return parsed, results
+
+
+def collect_latest_versions_threaded(
+    gh: Github,
+    session: requests.Session,
+    repo_urls: List[str],
+    state_map: Dict[str, str],
+    etags: Dict[str, str],
+    pushed_map: Dict[str, str],
+) -> Dict[str, Tuple[Optional[str], List[str]]]:
+    """
+    Thread-pool implementation of the version fan-out.
+
+    First a concurrent conditional-request pass probes each repo's releases
+    feed (see release_feed_unchanged); repos answering 304 with a version
+    already in state are resolved from cache without further API work.
+    The remainder are chunked into GRAPHQL_BATCH_SIZE-sized batches and
+    resolved with one GraphQL POST each; batches run concurrently on the
+    thread pool. If a batch POST fails outright, every repo in it falls
+    back to the per-repo REST checks in latest_version_for_repo(), also run
+    on the pool. Malformed URLs are reported without any API call.
+
+    Args:
+        gh: PyGithub client for the REST fallback path
+        session: requests Session with the Authorization header already set
+        repo_urls: watch list, already stripped of blanks
+        state_map: repo URL -> last seen version (read for the cached path)
+        etags: repo URL -> ETag; updated in place with fresh ETags
+        pushed_map: repo URL -> last seen pushed_at; updated in place so the
+            next run can skip version derivation for idle repos
+
+    Returns:
+        Mapping of repo URL -> (version, log_lines)
+    """
+    import requests
+
+    parsed, results = parse_watch_urls(repo_urls)
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        # ----- Conditional-request pass -----
+        precheck_futures = {
+            executor.submit(
+                release_feed_unchanged, session, owner, name, etags.get(url, "")
+            ): (url, owner, name)
+            for url, owner, name in parsed
+        }
+        needs_lookup: List[Tuple[str, str, str]] = []
+        for future in as_completed(precheck_futures):
+            url, owner, name = precheck_futures[future]
+            try:
+                unchanged, new_etag = future.result()
+            except requests.RequestException:
+                unchanged, new_etag = False, None
+            if new_etag:
+                etags[url] = new_etag
+            cached = state_map.get(url)
+            if unchanged and cached:
+                results[url] = (
+                    cached,
+                    ["  - releases unchanged (304); using cached version"],
+                )
+            else:
+                needs_lookup.append((url, owner, name))
+
+        # ----- GraphQL batch pass over whatever actually changed -----
+        batches = [
+            needs_lookup[i : i + GRAPHQL_BATCH_SIZE]
+            for i in range(0, len(needs_lookup), GRAPHQL_BATCH_SIZE)
+        ]
+        batch_futures = {
+            executor.submit(latest_versions_for_batch, session, batch): batch
+            for batch in batches
+        }
+        fallback_urls: List[str] = []
+        for future in as_completed(batch_futures):
+            batch = batch_futures[future]
+            try:
+                batch_results, batch_pushed = future.result()
+            except (requests.RequestException, ValueError) as e:
+                LOG.warning("GraphQL batch failed (%s); falling back to REST", e)
+                fallback_urls.extend(url for url, _owner, _name in batch)
+                continue
+            results.update(batch_results)
+            pushed_map.update(batch_pushed)
+
+        rest_futures = {
+            executor.submit(
+                latest_version_for_repo, gh, url, state_map.get(url), pushed_map
+            ): url
+            for url in fallback_urls
+        }
+        for future in as_completed(rest_futures):
+            results[rest_futures[future]] = future.result()
+
+    return results
+
+
+async def collect_latest_versions_async(
+    gh: Github,
+    token: str,
+    repo_urls: List[str],
+    state_map: Dict[str, str],
+    etags: Dict[str, str],
+    pushed_map: Dict[str, str],
+) -> Dict[str, Tuple[Optional[str], List[str]]]:
+    """
+    Event-loop implementation of the version fan-out (requires aiohttp).
+
+    Same three passes as collect_latest_versions_threaded – conditional
+    prechecks, GraphQL batches, per-repo REST fallback – but every request
+    is a coroutine on one event loop instead of a job on the thread pool.
+    That scales to watch lists far past CONCURRENCY with no per-worker
+    thread stacks; only the PyGithub fallback still hops onto threads,
+    via asyncio.to_thread, because that client is synchronous.
+    """
+    import aiohttp
+
+    parsed, results = parse_watch_urls(repo_urls)
+
+    connector = aiohttp.TCPConnector(limit=max(CONCURRENCY, 64))
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=30),
+        headers={"Authorization": f"bearer {token}"},
+    ) as session:
+        # ----- Conditional-request pass -----
+        async def precheck(
+            url: str, owner: str, name: str
+        ) -> Tuple[bool, Optional[str]]:
+            # As in release_feed_unchanged: conditional only when an ETag
+            # was captured on a previous run, so a first probe always gets
+            # the full 200 response that seeds etags[url]
+            etag = etags.get(url, "")
+            headers = {"If-None-Match": etag} if etag else {}
+            await asyncio.sleep(RATE_LIMIT.pause_needed())
+            async with session.get(
+                f"https://api.github.com/repos/{owner}/{name}/releases",
+                params={"per_page": 1},
+                headers=headers,
+            ) as resp:
+                RATE_LIMIT.update(resp.headers)
+                if resp.status == 304:
+                    return True, etags.get(url, "")
+                if resp.status < 400:
+                    return False, resp.headers.get("ETag")
+                return False, None
+
+        needs_lookup: List[Tuple[str, str, str]] = []
+        outcomes = await asyncio.gather(
+            *(precheck(url, owner, name) for url, owner, name in parsed),
+            return_exceptions=True,
+        )
+        for (url, owner, name), outcome in zip(parsed, outcomes):
+            if isinstance(outcome, BaseException):
+                unchanged, new_etag = False, None
+            else:
+                unchanged, new_etag = outcome
+            if new_etag:
+                etags[url] = new_etag
+            cached = state_map.get(url)
+            if unchanged and cached:
+                results[url] = (
+                    cached,
+                    ["  - releases unchanged (304); using cached version"],
+                )
+            else:
+                needs_lookup.append((url, owner, name))
+
+        # ----- GraphQL batch pass over whatever actually changed -----
+        async def run_batch(
+            batch: List[Tuple[str, str, str]]
+        ) -> Tuple[Dict[str, Tuple[Optional[str], List[str]]], Dict[str, str]]:
+            await asyncio.sleep(RATE_LIMIT.pause_needed())
+            async with session.post(
+                GRAPHQL_URL, json={"query": build_batch_query(batch)}
+            ) as resp:
+                RATE_LIMIT.update(resp.headers)
+                resp.raise_for_status()
+                return versions_from_batch_payload(batch, await resp.json())
+
+        batches = [
+            needs_lookup[i : i + GRAPHQL_BATCH_SIZE]
+            for i in range(0, len(needs_lookup), GRAPHQL_BATCH_SIZE)
+        ]
+        fallback_urls: List[str] = []
+        batch_outcomes = await asyncio.gather(
+            *(run_batch(batch) for batch in batches), return_exceptions=True
+        )
+        for batch, outcome in zip(batches, batch_outcomes):
+            if isinstance(outcome, BaseException):
+                LOG.warning("GraphQL batch failed (%s); falling back to REST", outcome)
+                fallback_urls.extend(url for url, _owner, _name in batch)
+            else:
+                batch_results, batch_pushed = outcome
+                results.update(batch_results)
+                pushed_map.update(batch_pushed)
+
+        # ----- Per-repo REST fallback (synchronous PyGithub, on threads) -----
+        fallback_results = await asyncio.gather(
+            *(
+                asyncio.to_thread(
+                    latest_version_for_repo, gh, url, state_map.get(url), pushed_map
+                )
+                for url in fallback_urls
+            )
+        )
+        results.update(dict(zip(fallback_urls, fallback_results)))
+
+    return results
+
+
+def collect_latest_versions(
+    gh: Github,
+    token: str,
+    repo_urls: List[str],
+    state_map: Dict[str, str],
+    etags: Dict[str, str],
+    pushed_map: Dict[str, str],
+) -> Dict[str, Tuple[Optional[str], List[str]]]:
+    """
+    Resolve the latest version for every watched repo.
+
+    Dispatches to the aiohttp event-loop implementation when aiohttp is
+    installed (with uvloop when available), else to the thread-pool
+    implementation. Both produce identical results; the async path simply
+    scales further for large watch lists.
+
+    Returns:
+        Mapping of repo URL -> (version, log_lines)
+    """
+    try:
+        # Optional async fast path: a single event loop runs the whole
+        # network fan-out with no per-worker thread stacks
+        import aiohttp  # noqa: F401 – presence check; used in the coroutine
+    except ImportError:
+        aiohttp = None
+    if aiohttp is not None:
+        try:
+            import uvloop  # faster drop-in event loop
+
+            uvloop.install()
+        except ImportError:
+            pass
+        return asyncio.run(
+            collect_latest_versions_async(
+                gh, token, repo_urls, state_map, etags, pushed_map
+            )
+        )
+    return collect_latest_versions_threaded(
+        gh, make_session(token), repo_urls, state_map, etags, pushed_map
+    )
+
+
 # ---------- Main ----------
 
 
-def main() -> int:
-    # ===== Initialize GitHub API client =====
-    gh = ensure_github()
+def run() -> int:
+    # ===== Initialize GitHub API clients =====
+    token = ensure_token()
+    gh = ensure_github()  # REST fallback path
 
     # ===== Load watch list (input) - supports both file and directory =====
     watch_repos = load_watch_repositories(WATCH_FILE)
@@ -299,54 +1111,93 @@ def main() -> int:
         die(f"No repositories found in {WATCH_FILE}")
 
     # ===== Load state (previous run results) =====
-    state = load_yaml(STATE_FILE, default={})
+    # Fall back to the legacy .yaml file when upgrading from an older
+    # checkout, so the switch to JSON doesn't trigger a full rescan.
+    state = load_yaml(prefer_existing(STATE_FILE), default={})
     state_map: Dict[str, str] = (
         (state.get("repositories") or {}) if isinstance(state, dict) else {}
     )
     if not isinstance(state_map, dict):
         state_map = {}
 
+    # Per-repo pushed_at timestamps ride along in the state doc; missing on
+    # older state files, in which case no repo gets the idle-skip this run.
+    pushed_map: Dict[str, str] = (
+        (state.get("pushed_at") or {}) if isinstance(state, dict) else {}
+    )
+    if not isinstance(pushed_map, dict):
+        pushed_map = {}
+
+    # ===== Load ETag cache (for conditional requests) =====
+    etags = load_yaml(prefer_existing(ETAGS_FILE), default={})
+    if not isinstance(etags, dict):
+        etags = {}
+
     # ===== Initialize output tracking =====
     process_map: Dict[str, str] = {}
 
     # ===== Print startup summary =====
-    print(f"Loaded {len(watch_repos)} repositories from {WATCH_FILE}")
-    print(f"Current state has {len(state_map)} entries in {STATE_FILE}")
+    LOG.info("Loaded %d repositories from %s", len(watch_repos), WATCH_FILE)
+    LOG.info("Current state has %d entries in %s", len(state_map), STATE_FILE)
 
     # ===== Check each repository for changes =====
-    for repo_url in watch_repos:
-        repo_url = str(repo_url).strip()
-        if not repo_url:
-            continue
+    # All network work happens inside collect_latest_versions (batched
+    # GraphQL with threaded REST fallback); the change detection below then
+    # walks the watch list in its original order.
+    repo_urls = [u for u in (str(r).strip() for r in watch_repos) if u]
+    results = collect_latest_versions(
+        gh, token, repo_urls, state_map, etags, pushed_map
+    )
+
+    for repo_url in repo_urls:
+        latest, log_lines = results[repo_url]
 
-        print(f"\nChecking {repo_url} ...")
-        latest = latest_version_for_repo(gh, repo_url)
+        LOG.info("\nChecking %s ...", repo_url)
+        for line in log_lines:
+            LOG.info("%s", line)
         if not latest:
-            print(f"  - No version/release/tag found; skipping.")
+            LOG.info("  - No version/release/tag found; skipping.")
             continue
 
         current = state_map.get(repo_url)
         if current != latest:
-            print(f"  - CHANGE detected: {current!r} -> {latest!r}")
+            LOG.info("  - CHANGE detected: %r -> %r", current, latest)
             process_map[repo_url] = latest
             state_map[repo_url] = latest
         else:
-            print(f"  - Up to date at {latest}")
+            LOG.info("  - Up to date at %s", latest)
 
     #  ===== Write output files =====
-    process_doc: Dict[str, Any] = {"repositories": process_map}
-    state_doc: Dict[str, Any] = {"repositories": state_map}
-
-    dump_yaml(PROCESS_FILE, process_doc)
-    dump_yaml(STATE_FILE, state_doc)
+    # Sort each map once up front (Timsort over key tuples) and dump with
+    # sort_keys=False: the serializers' own sorting re-compares every key
+    # during emission, which is noticeably slower on large state maps.
+    # Python dicts preserve insertion order, so the output bytes – including
+    # the top-level key order – are identical to a sorted dump.
+    process_doc: Dict[str, Any] = {"repositories": dict(sorted(process_map.items()))}
+    state_doc: Dict[str, Any] = {
+        "pushed_at": dict(sorted(pushed_map.items())),
+        "repositories": dict(sorted(state_map.items())),
+    }
+
+    dump_yaml(PROCESS_FILE, process_doc, sort_keys=False)
+    dump_yaml(STATE_FILE, state_doc, sort_keys=False)
+    dump_yaml(ETAGS_FILE, dict(sorted(etags.items())), sort_keys=False)
 
     # ===== Print summary =====
-    print(f"\nWrote {PROCESS_FILE} with {len(process_map)} change(s).")
-    print(f"Updated {STATE_FILE} with {len(state_map)} total repo(s).")
+    LOG.info("\nWrote %s with %d change(s).", PROCESS_FILE, len(process_map))
+    LOG.info("Updated %s with %d total repo(s).", STATE_FILE, len(state_map))
 
     # Non-zero exit if there were changes? Typically we exit 0 either way.
     return 0
 
 
+def main() -> int:
+    listener = setup_logging()
+    try:
+        return run()
+    finally:
+        listener.stop()  # flush any queued records before exiting
+
+
 if __name__ == "__main__":
     sys.exit(main())